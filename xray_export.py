@@ -7,21 +7,50 @@ Xray Cloud에서 JQL로 Test들을 조회해
 (필요 시) 이슈 단위 Precondition(정의)까지 엑셀로 저장.
 
 pip install requests pandas openpyxl python-dotenv
+(선택) pip install orjson brotli  # JSON 직렬화/파싱 가속, Brotli 응답 압축
+(선택) pip install "httpx[http2]"  # --http2 옵션 사용 시
 사용 예:
 python xray_export_steps_precond.py \
   --outfile xray_tests.xlsx
 """
 
 import argparse
+import hashlib
+import json
+import sqlite3
 import sys
 import time
 import os
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple, Union
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+try:
+    # 설치되어 있으면 C 구현인 orjson으로 JSON을 직렬화/파싱 (없으면 표준 json 사용)
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # --http2 옵션에서만 사용 (pip install "httpx[http2]")
+    import httpx
+except ImportError:
+    httpx = None
+
+# requests.Session(HTTP/1.1 keep-alive) 또는 httpx.Client(HTTP/2)
+HttpClient = Union[requests.Session, "httpx.Client"]
+HttpResponse = Union[requests.Response, "httpx.Response"]
+HTTP_ERRORS = (requests.HTTPError,) if httpx is None else (requests.HTTPError, httpx.HTTPStatusError)
+
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
@@ -37,167 +66,437 @@ CUSTOM_FIELDS_TO_EXPORT = {
 # ▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲▲
 # --------------------------------------------------------------------
 
+# 엑셀 시트의 열 순서 (flatten_rows가 만드는 행 tuple과 같은 순서)
+EXPORT_COLUMNS = [
+    "Test Key", "Summary", "Labels",
+    *CUSTOM_FIELDS_TO_EXPORT.values(),  # 설정된 사용자 정의 필드 컬럼들을 동적으로 추가
+    "Step #",
+    "Step Precondition", "Action", "Expected Result",
+    "Issue Preconditions (keys & titles)", "Issue Preconditions Definition",
+]
+
 XRAY_AUTH = "https://xray.cloud.getxray.app/api/v2/authenticate"
 XRAY_GRAPHQL = "https://xray.cloud.getxray.app/api/v2/graphql"
 
+# Xray Cloud getTests가 한 페이지에 반환하는 최대 테스트 수
+XRAY_MAX_LIMIT = 100
+
+# 429(Too Many Requests) 응답 시 재시도 횟수
+MAX_RETRIES = 5
+
+# 조회한 페이지를 재사용하는 로컬 캐시 (--no-cache로 끌 수 있음)
+DEFAULT_CACHE_PATH = ".xray_cache.sqlite"
+CACHE_TTL_SEC = 60 * 60
+
+# 행 변환 루프에서 매번 dict를 순회하지 않도록 미리 고정한 사용자 정의 필드 ID 목록
+_CF_IDS = tuple(CUSTOM_FIELDS_TO_EXPORT)
+
+# 엑셀 출력에 실제로 사용하는 Jira 필드만 요청 ("*all"은 진단 모드에서만 사용)
+EXPORT_JIRA_FIELDS = ["key", "summary", "labels", *_CF_IDS]
+DIAGNOSE_JIRA_FIELDS = ["*all"]
+
 # ❗steps에 data가 없고 precondition/action/result만 있는 스키마에 맞춤
-GQL_GET_TESTS = """
-query ($jql: String!, $limit: Int!, $start: Int!) {
-  getTests(jql: $jql, limit: $limit, start: $start) {
+GQL_TESTS_SELECTION = """
     total
     start
     limit
     results {
-      jira(fields: ["*all"])
+      jira(fields: %s)
       steps { id action result customFields { name value } }
       # 아래는 이슈 단위 Precondition 이슈(선택적으로 엑셀에 함께 표시하려고 유지)
       preconditions(limit: 50) {
         results {jira(fields:["key","summary"]) definition }
       }
     }
-  }
-}
-""".strip()
+"""
 
-def get_token(client_id: str, client_secret: str, timeout: int = 30) -> str:
+def build_tests_query(jira_fields: List[str]) -> str:
+    """한 페이지를 조회하는 getTests 쿼리를 만듭니다."""
+    selection = GQL_TESTS_SELECTION % json.dumps(jira_fields)
+    return (
+        "query ($jql: String!, $limit: Int!, $start: Int!) {\n"
+        "  getTests(jql: $jql, limit: $limit, start: $start) {" + selection + "  }\n"
+        "}"
+    )
+
+def build_batch_query(pages: int, jira_fields: List[str]) -> str:
+    """여러 페이지를 별칭(p0, p1, ...)으로 묶어 한 번의 요청으로 조회하는 쿼리를 만듭니다."""
+    selection = GQL_TESTS_SELECTION % json.dumps(jira_fields)
+    params = "".join(f", $s{i}: Int!" for i in range(pages))
+    body = "".join(
+        f"  p{i}: getTests(jql: $jql, limit: $limit, start: $s{i}) {{{selection}  }}\n"
+        for i in range(pages)
+    )
+    return f"query ($jql: String!, $limit: Int!{params}) {{\n{body}}}"
+
+GQL_GET_TESTS = build_tests_query(EXPORT_JIRA_FIELDS)
+GQL_DIAGNOSE_TESTS = build_tests_query(DIAGNOSE_JIRA_FIELDS)
+
+class GraphQLError(RuntimeError):
+    """GraphQL 응답에 errors가 포함된 경우 (HTTP 요청 자체는 성공)."""
+
+def create_session(http2: bool = False) -> HttpClient:
+    """모든 API 호출이 TCP/TLS 연결을 재사용하도록 공유 세션을 생성합니다."""
+    if http2:
+        if httpx is None:
+            raise RuntimeError('--http2 옵션을 사용하려면 httpx가 필요합니다: pip install "httpx[http2]"')
+        # 서버가 h2를 협상하면 동시 요청들이 하나의 연결 위에서 HTTP/2 스트림으로 다중화됨
+        # (httpx.Client는 스레드 간 공유 가능하므로 기존 스레드 풀을 그대로 사용).
+        # 연결 수는 제한하지 않아 HTTP/1.1로 폴백되어도 워커들이 한 연결에 줄 서지 않음
+        return httpx.Client(http2=True, headers={"Content-Type": "application/json"})
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    # requests는 기본으로 gzip/deflate 압축을 요청하며, brotli가 설치되어 있으면 br도 포함합니다.
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+def get_token(session: HttpClient, client_id: str, client_secret: str, timeout: int = 30) -> str:
     """Xray 인증 API를 호출하여 토큰을 받아옵니다."""
-    r = requests.post(XRAY_AUTH, json={"client_id": client_id, "client_secret": client_secret}, timeout=timeout)
+    r = session.post(XRAY_AUTH, json={"client_id": client_id, "client_secret": client_secret}, timeout=timeout)
     r.raise_for_status()
     token = r.json()
     if not isinstance(token, str):
         raise RuntimeError(f"Unexpected token response: {token}")
     return token
 
-def gql(session: requests.Session, token: str, query: str, variables: Dict[str, Any], timeout: int = 60) -> Dict:
+def _json_dumps(obj: Any) -> bytes:
+    """객체를 UTF-8 JSON 바이트로 직렬화합니다."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _json_loads(data: bytes) -> Any:
+    """JSON 바이트를 파싱합니다."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+@lru_cache(maxsize=16)
+def _query_body_prefix(query: str) -> bytes:
+    """요청 본문 중 쿼리 부분은 페이지마다 같으므로 한 번만 직렬화해 재사용합니다."""
+    return b'{"query":' + _json_dumps(query) + b',"variables":'
+
+def _retry_after_seconds(resp: HttpResponse, attempt: int) -> float:
+    """429 응답의 Retry-After 헤더(초)를 읽고, 없으면 지수 백오프 값을 사용합니다."""
+    try:
+        return max(float(resp.headers.get("Retry-After", "")), 0.0)
+    except ValueError:
+        return float(2 ** attempt)
+
+def gql(session: HttpClient, token: str, query: str, variables: Dict[str, Any], timeout: int = 60) -> Dict:
     """GraphQL API를 실행하고 결과를 반환합니다."""
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    resp = session.post(XRAY_GRAPHQL, headers=headers, json={"query": query, "variables": variables}, timeout=timeout)
+    headers = {"Authorization": f"Bearer {token}"}
+    body = _query_body_prefix(query) + _json_dumps(variables) + b"}"
+    # 미리 직렬화한 본문은 requests에서는 data=, httpx에서는 content=로 전달
+    body_arg = {"data": body} if isinstance(session, requests.Session) else {"content": body}
+    for attempt in range(MAX_RETRIES + 1):
+        resp = session.post(XRAY_GRAPHQL, headers=headers, timeout=timeout, **body_arg)
+        if resp.status_code != 429 or attempt == MAX_RETRIES:
+            break
+        # 요청 한도 초과: 서버가 알려준 시간만큼 쉬었다가 재시도
+        time.sleep(_retry_after_seconds(resp, attempt))
     resp.raise_for_status()
-    j = resp.json()
+    j = _json_loads(resp.content)
     if "errors" in j:
-        raise RuntimeError(j["errors"])
+        raise GraphQLError(j["errors"])
     return j["data"]
 
-def fetch_all_tests(token: str, jql: str, limit: int = 100, sleep_sec: float = 0.2) -> List[Dict]:
-    """JQL에 해당하는 모든 테스트 이슈를 가져옵니다."""
-    s = requests.Session()
+def open_cache(path: str, ttl_sec: float = CACHE_TTL_SEC) -> sqlite3.Connection:
+    """페이지 응답 캐시(SQLite)를 열고, TTL이 지난 항목은 삭제합니다."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "query_hash TEXT NOT NULL, start INTEGER NOT NULL, fetched_at REAL NOT NULL, payload BLOB NOT NULL, "
+            "PRIMARY KEY (query_hash, start))"
+        )
+        conn.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - ttl_sec,))
+        conn.commit()
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+def _warn_cache_error(e: Exception) -> None:
+    """캐시는 최적화일 뿐이므로 오류가 나면 경고만 출력하고 캐시 없이 계속 진행합니다."""
+    print(f"Warning: page cache disabled ({e}); fetching from Xray without cache", file=sys.stderr)
+
+def _cache_key(client_id: str, query: str, jql: str, limit: int) -> str:
+    """인증 정보(Client ID), 쿼리 본문, JQL, 페이지 크기가 모두 같을 때만 캐시가 재사용되도록 키를 만듭니다."""
+    return hashlib.sha256(f"{client_id}\n{query}\n{jql}\n{limit}".encode("utf-8")).hexdigest()
+
+def _report_cache_hits(hits: int) -> None:
+    """캐시에서 가져온 페이지가 있으면 알려줍니다."""
+    if hits:
+        print(f" -> {hits} page(s) served from cache (use --no-cache to refresh)")
+
+def _cache_get(cache: Optional[sqlite3.Connection], key: str, start: int) -> Optional[Dict]:
+    """캐시된 getTests 페이지를 반환합니다. 없으면 None."""
+    if cache is None:
+        return None
+    row = cache.execute("SELECT payload FROM pages WHERE query_hash = ? AND start = ?", (key, start)).fetchone()
+    return _json_loads(row[0]) if row else None
+
+def _cache_put(cache: Optional[sqlite3.Connection], key: str, start: int, page: Dict) -> None:
+    """getTests 페이지를 캐시에 저장합니다."""
+    if cache is None:
+        return
+    cache.execute(
+        "INSERT OR REPLACE INTO pages (query_hash, start, fetched_at, payload) VALUES (?, ?, ?, ?)",
+        (key, start, time.time(), _json_dumps(page)),
+    )
+    cache.commit()
+
+def _cache_delete(cache: Optional[sqlite3.Connection], key: str) -> None:
+    """키에 해당하는 캐시 페이지를 모두 삭제합니다."""
+    if cache is None:
+        return
+    cache.execute("DELETE FROM pages WHERE query_hash = ?", (key,))
+    cache.commit()
+
+def _load_cached_pages(cache: Optional[sqlite3.Connection], key: str) -> Tuple[Optional[Dict], Dict[int, List[Dict]]]:
+    """첫 페이지와 나머지 페이지가 모두 캐시에 있을 때만 (첫 페이지, {start: results})를 반환합니다.
+
+    중단된 실행이 남긴 일부 페이지를 새로 조회한 페이지와 섞으면 서로 다른 시점의 결과가
+    합쳐져 행이 중복/누락될 수 있으므로, 하나라도 빠져 있으면 남은 페이지를 지우고 (None, {})를 반환합니다.
+    """
+    data = _cache_get(cache, key, 0)
+    if data is None:
+        _cache_delete(cache, key)
+        return None, {}
+    page_limit = data.get("limit") or 1
+    pages: Dict[int, List[Dict]] = {}
+    for start in range(page_limit, data.get("total", 0), page_limit):
+        cached = _cache_get(cache, key, start)
+        if cached is None:
+            _cache_delete(cache, key)
+            return None, {}
+        pages[start] = cached.get("results") or []
+    return data, pages
+
+def fetch_all_tests(s: HttpClient, token: str, jql: str, limit: int = 100, workers: int = 8,
+                    pages_per_request: int = 5, cache: Optional[sqlite3.Connection] = None,
+                    client_id: str = "") -> List[Dict]:
+    """JQL에 해당하는 모든 테스트 이슈를 가져옵니다. cache가 주어지면 페이지 단위로 재사용합니다."""
     out: List[Dict] = []
-    start = 0
+    limit = min(limit, XRAY_MAX_LIMIT)
+    # 다른 Xray 테넌트/인증 정보로 바꾼 경우 이전 결과를 재사용하지 않도록 client_id도 키에 포함
+    cache_key = _cache_key(client_id, GQL_GET_TESTS, jql, limit)
+    # 캐시는 모든 페이지가 있을 때만 통째로 사용 (일부만 있으면 전부 새로 조회)
     try:
-        # 첫 페이지를 가져와서 전체 개수를 확인
-        data = gql(s, token, GQL_GET_TESTS, {"jql": jql, "limit": limit, "start": start})["getTests"]
-    except Exception as e:
-        print(f"Error fetching first page: {e}", file=sys.stderr)
-        return []
+        data, pages = _load_cached_pages(cache, cache_key)
+    except sqlite3.Error as e:
+        _warn_cache_error(e)
+        cache, data, pages = None, None, {}
+    cache_hits = 1 + len(pages) if data is not None else 0
+
+    def store(start: int, page: Dict) -> None:
+        nonlocal cache
+        try:
+            _cache_put(cache, cache_key, start, page)
+        except sqlite3.Error as e:
+            _warn_cache_error(e)
+            cache = None
+    if data is None:
+        try:
+            # 첫 페이지를 가져와서 전체 개수를 확인
+            data = gql(s, token, GQL_GET_TESTS, {"jql": jql, "limit": limit, "start": 0})["getTests"]
+        except Exception as e:
+            print(f"Error fetching first page: {e}", file=sys.stderr)
+            return []
+        store(0, data)
 
     total = data.get("total", 0)
-    if not total:
-        return []
-
     batch = data.get("results") or []
+    if not total or not batch:
+        _report_cache_hits(cache_hits)
+        return []
     out.extend(batch)
-    start += data.get("limit", limit)
-
-    with tqdm(total=total, desc="   Fetching tests", unit=" tests", initial=len(batch)) as pbar:
-        while start < total and batch:
-            data = gql(s, token, GQL_GET_TESTS, {"jql": jql, "limit": limit, "start": start})["getTests"]
-            batch = data.get("results") or []
-            out.extend(batch)
-            pbar.update(len(batch))
-            start += data.get("limit", limit)
-            time.sleep(sleep_sec)
+
+    # 나머지 페이지의 시작 위치는 미리 계산할 수 있으므로, 캐시에서 가져오지 않은 페이지를
+    # pages_per_request개씩 한 요청으로 묶어 동시에 요청
+    page_limit = data.get("limit") or limit
+    offsets = range(page_limit, total, page_limit)
+    missing = [start for start in offsets if start not in pages]
+    _report_cache_hits(cache_hits)
+    chunks = [missing[i:i + pages_per_request] for i in range(0, len(missing), pages_per_request)]
+    # 묶음 크기별 쿼리 문자열도 한 번만 만들어 재사용
+    batch_queries = {n: build_batch_query(n, EXPORT_JIRA_FIELDS) for n in {len(c) for c in chunks}}
+
+    def fetch_pages(starts: List[int]) -> List[Dict]:
+        if len(starts) > 1:
+            variables: Dict[str, Any] = {"jql": jql, "limit": page_limit}
+            variables.update({f"s{i}": start for i, start in enumerate(starts)})
+            try:
+                result = gql(s, token, batch_queries[len(starts)], variables)
+                return [result[f"p{i}"] for i in range(len(starts))]
+            except GraphQLError:
+                # 묶음 요청이 Xray 제한(반환 항목 수/복잡도 등)으로 거부되면 페이지별 단일 요청으로 재시도
+                pass
+        return [
+            gql(s, token, GQL_GET_TESTS, {"jql": jql, "limit": page_limit, "start": start})["getTests"]
+            for start in starts
+        ]
+
+    initial = len(batch) + sum(len(results) for results in pages.values())
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with tqdm(total=total, desc="   Fetching tests", unit=" tests", initial=initial) as pbar:
+            futures = {executor.submit(fetch_pages, starts): starts for starts in chunks}
+            for future in as_completed(futures):
+                for start, page in zip(futures[future], future.result()):
+                    # SQLite 연결은 메인 스레드에서만 사용
+                    store(start, page)
+                    pages[start] = page.get("results") or []
+                    pbar.update(len(pages[start]))
+    except BaseException:
+        # 한 요청이라도 실패하면 대기 중인 요청은 보내지 않고 바로 오류를 알림
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    # 완료 순서와 관계없이 원래 페이지 순서대로 결과를 합침
+    for start in offsets:
+        out.extend(pages[start])
+    if len(out) < total:
+        print(f"Warning: expected {total} tests but fetched {len(out)}", file=sys.stderr)
     return out
 
 def _format_jira_field_value(value: Any) -> str:
     """Formats a Jira custom field value (e.g., dropdown) into a displayable string."""
+    if isinstance(value, str):
+        # 가장 흔한 텍스트 필드는 추가 검사 없이 바로 반환
+        return value
     if isinstance(value, dict) and 'value' in value:
         # 단일 선택 드롭다운: {'value': '선택값'}
         return str(value.get('value', ''))
     elif isinstance(value, list):
         # 다중 선택 드롭다운: [{'value': '선택값1'}, {'value': '선택값2'}]
-        str_values = []
-        for item in value:
-            if isinstance(item, dict) and 'value' in item:
-                str_values.append(str(item.get('value', '')))
-            else:
-                str_values.append(str(item))
+        str_values = [
+            str(item.get('value', '')) if isinstance(item, dict) and 'value' in item else str(item)
+            for item in value
+        ]
         return ", ".join(filter(None, str_values))
     elif value:
         # 기타 단순 값 (e.g., 텍스트 필드)
         return str(value)
     return ""
 
-def flatten_rows(tests: List[Dict]) -> List[Dict[str, Any]]:
-    """Xray 테스트 데이터를 엑셀 행으로 변환합니다."""
-    rows: List[Dict[str, Any]] = []
-    for test in tests:
-        jira_info = test.get("jira") or {}
-        labels = jira_info.get("labels") or []
-
-        # 설정된 사용자 정의 필드들의 값을 가져옵니다.
-        custom_field_values = {}
-        for field_id, col_name in CUSTOM_FIELDS_TO_EXPORT.items():
-            field_value = jira_info.get(field_id)
-            custom_field_values[col_name] = _format_jira_field_value(field_value)
- 
+# 스텝 커스텀 필드 중 스텝 Precondition으로 사용할 필드 이름 (소문자)
+_PRECOND = "precondition"
+
+def _normalize_whitespace(text: str) -> str:
+    """연속된 공백 문자(줄바꿈, 탭, NBSP 등)를 공백 하나로 합칩니다."""
+    # str.split()은 C 레벨 한 번의 스캔으로 모든 유니코드 공백을 처리하므로
+    # translate + 정규식 조합보다 빠르고 정확합니다.
+    return " ".join(text.split())
+
+def flatten_rows(tests: List[Dict]) -> List[Tuple[Any, ...]]:
+    """Xray 테스트 데이터를 EXPORT_COLUMNS 순서의 엑셀 행(tuple)으로 변환합니다."""
+    rows: List[Tuple[Any, ...]] = []
+    jira_infos = [test.get("jira") or {} for test in tests]
+
+    # 설정된 사용자 정의 필드들의 값을 테스트별이 아닌 필드(열) 단위로 한 번에 포맷합니다.
+    fmt = _format_jira_field_value
+    custom_field_columns = [
+        [fmt(jira_info.get(field_id)) for jira_info in jira_infos]
+        for field_id in _CF_IDS
+    ]
+
+    for i, (test, jira_info) in enumerate(zip(tests, jira_infos)):
+        get = jira_info.get
+        labels = get("labels") or []
+
         # 이슈 단위 Precondition(있으면 참고용으로 묶어서 한 셀에)
-        precondition_results = (test.get("preconditions") or {}).get("results") or []
-        pre_titles_list: List[str] = []
-        pre_defs_list: List[str] = []
-        for p in precondition_results:
-            if not p:
-                continue
-            pre_jira = p.get("jira") or {}
-            pre_key = pre_jira.get("key")
-            pre_summary = pre_jira.get("summary")
-            if pre_key and pre_summary:
-                pre_titles_list.append(f"{pre_key} - {pre_summary}")
-
-            definition = p.get("definition")
-            if definition:
-                # Normalize whitespace
-                normalized_def = ' '.join(definition.split())
-                pre_defs_list.append(normalized_def)
-
-        base_row = {
-            "Test Key": jira_info.get("key", ""),
-            "Summary": jira_info.get("summary", ""),
-            "Labels": ", ".join(labels),
-            **custom_field_values,
-            "Issue Preconditions (keys & titles)": "; ".join(pre_titles_list),
-            "Issue Preconditions Definition": " | ".join(pre_defs_list),
-        }
+        precondition_results = [p for p in (test.get("preconditions") or {}).get("results") or [] if p]
+        pre_titles = "; ".join(
+            f"{pre_jira['key']} - {pre_jira['summary']}"
+            for pre_jira in (p.get("jira") or {} for p in precondition_results)
+            if pre_jira.get("key") and pre_jira.get("summary")
+        )
+        pre_defs = " | ".join(
+            _normalize_whitespace(p["definition"]) for p in precondition_results if p.get("definition")
+        )
+
+        # 스텝과 무관한 앞/뒤 열은 테스트당 한 번만 만들어 재사용
+        head = (
+            get("key", ""),
+            get("summary", ""),
+            ", ".join(labels),
+            *[values[i] for values in custom_field_columns],
+        )
+        tail = (pre_titles, pre_defs)
 
         # ❗스텝: precondition/action/result만 사용
         steps = test.get("steps") or []
         if not steps:
-            rows.append({**base_row, "Step #": "", "Step Precondition": "", "Action": "", "Expected Result": ""})
+            rows.append((*head, "", "", "", "", *tail))
         else:
             for idx, step in enumerate(steps, start=1):
-                # 스텝의 커스텀 필드에서 'precondition' 찾기
-                step_precondition = ""
-                custom_fields = step.get("customFields") or []
-                for cf in custom_fields:
-                    if cf and cf.get("name", "").lower() == "precondition":
-                        step_precondition = cf.get("value") or ""
-                        break
-                rows.append({
-                    **base_row,
-                    "Step #": idx,
-                    "Step Precondition": step_precondition.strip(),
-                    "Action": (step.get("action") or "").strip(),
-                    "Expected Result": (step.get("result") or "").strip(),
-                })
+                # 스텝의 커스텀 필드에서 첫 번째 'precondition' 찾기 (대소문자 무시)
+                step_precondition = next(
+                    (cf.get("value") or "" for cf in (step.get("customFields") or [])
+                     if cf and (cf.get("name") or "").lower() == _PRECOND),
+                    "",
+                )
+                rows.append((
+                    *head,
+                    idx,
+                    step_precondition.strip(),
+                    (step.get("action") or "").strip(),
+                    (step.get("result") or "").strip(),
+                    *tail,
+                ))
     return rows
 
-def run_field_diagnostics(token: str, jql: str):
+def write_excel(rows: List[Tuple[Any, ...]], columns: List[str], outfile: str, sheet_name: str) -> None:
+    """행(tuple) 목록을 DataFrame을 거치지 않고 openpyxl write-only 모드로 엑셀 파일에 저장합니다."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+
+    # 간단 열폭 조정 (write-only 시트는 셀을 다시 읽을 수 없으므로,
+    # 셀을 하나씩 순회하지 않고 열 단위로 문자열 길이의 최댓값을 계산)
+    col_values = list(zip(*rows)) or [()] * len(columns)
+    for i, (col, values) in enumerate(zip(columns, col_values), start=1):
+        max_len = max(map(len, map(str, values)), default=0)
+        width = max(max_len, len(col), 10)
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, 80)
+
+    header = []
+    for c in columns:
+        cell = WriteOnlyCell(ws, value=c)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(outfile)
+
+def build_field_diagnostics(tests: List[Dict]) -> pd.DataFrame:
+    """customfield ID(행) x 테스트 키(열) 형태의 진단 표를 만듭니다."""
+    # 가져온 모든 테스트의 Jira 필드를 한 번에 표로 만들어 customfield 열만 남김 (누락 방지)
+    # dtype=object: null이 섞인 정수 필드가 float64로 바뀌지 않도록 원래 값을 그대로 유지
+    df = pd.DataFrame([test.get("jira") or {} for test in tests], dtype=object)
+    df.index = df["key"].fillna("N/A") if "key" in df.columns else ["N/A"] * len(df)
+    df = df.loc[:, df.columns.str.startswith("customfield_")]
+    df = df.reindex(columns=sorted(df.columns))
+
+    # 값이 없는 셀(NaN)은 None으로 바꾼 뒤 열 단위로 포맷
+    df = df.where(df.notna(), None)
+    df = df.apply(lambda col: col.map(_format_jira_field_value))
+
+    df = df.T
+    df.index.name = "Field ID"
+    df.columns.name = None
+    return df.reset_index()
+
+def run_field_diagnostics(s: HttpClient, token: str, jql: str):
     """사용자 정의 필드 ID를 찾기 위한 진단 파일을 생성합니다."""
     print("\n[Running Field Diagnostics]")
     print("[1/3] Fetching a few sample tests...")
-    s = requests.Session()
     try:
         # 전체가 아닌 한 페이지만 가져오도록 수정
-        data = gql(s, token, GQL_GET_TESTS, {"jql": jql, "limit": 5, "start": 0})["getTests"]
+        data = gql(s, token, GQL_DIAGNOSE_TESTS, {"jql": jql, "limit": 5, "start": 0})["getTests"]
         tests = data.get("results") or []
     except Exception as e:
         print(f"Error fetching sample tests: {e}", file=sys.stderr)
@@ -209,29 +508,9 @@ def run_field_diagnostics(token: str, jql: str):
     print(f" -> {len(tests)} tests fetched for diagnosis.")
 
     print("[2/3] Analyzing custom fields...")
-    diag_data = {}
-
-    # 가져온 모든 테스트에서 customfield 키를 수집하여 누락 방지
-    all_custom_field_ids = {k for test in tests for k in test.get("jira", {}).keys() if k.startswith("customfield_")}
-    custom_field_ids = sorted(list(all_custom_field_ids))
-
-    # 각 테스트의 키와 값을 수집
-    for test in tests:
-        jira_info = test.get("jira", {})
-        test_key = jira_info.get("key", "N/A")
-
-        for field_id in custom_field_ids:
-            if field_id not in diag_data:
-                diag_data[field_id] = {}
-
-            value = jira_info.get(field_id)
-            diag_data[field_id][test_key] = _format_jira_field_value(value)
+    df = build_field_diagnostics(tests)
 
     print("[3/3] Writing diagnostic Excel file...")
-    df = pd.DataFrame.from_dict(diag_data, orient='index')
-    df.index.name = "Field ID"
-    df.reset_index(inplace=True)
-
     outfile = "field_diagnostics.xlsx"
     df.to_excel(outfile, index=False)
     print("\n--- 진단 완료 ---")
@@ -243,9 +522,30 @@ def main():
     """메인 함수"""
     ap = argparse.ArgumentParser(description="Export Xray Tests (steps: precondition/action/result) to XLSX")
     ap.add_argument("--outfile", default="xray_tests.xlsx", help="Output file name (default: xray_tests.xlsx)")
-    ap.add_argument("--limit", type=int, default=100, help="Number of tests to fetch per request (default: 100)")
+    ap.add_argument("--limit", type=int, default=XRAY_MAX_LIMIT,
+                    help=f"Number of tests to fetch per page (default/max: {XRAY_MAX_LIMIT})")
+    ap.add_argument("--workers", type=int, default=8, help="Number of GraphQL requests sent concurrently (default: 8)")
+    # Xray Cloud는 한 쿼리가 반환하는 항목 수(중첩된 preconditions 포함)를 제한합니다.
+    # 100개 테스트 x preconditions(limit: 50)이면 최악의 경우 한 페이지만으로도 5,100개이므로
+    # 항상 안전한 값은 1이고, 기본값 5는 보통의 데이터 기준입니다. 거부된 묶음은 페이지별로 재시도합니다.
+    ap.add_argument("--pages-per-request", type=int, default=5,
+                    help="Number of pages batched into one GraphQL request (default: 5; always-safe: 1, "
+                         "batches Xray rejects are retried one page at a time)")
+    ap.add_argument("--http2", action="store_true",
+                    help="Use one multiplexed HTTP/2 connection via httpx instead of HTTP/1.1 keep-alive")
+    ap.add_argument("--no-cache", action="store_true", help="Always fetch from Xray instead of using the local page cache")
+    ap.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                    help=f"Local page cache file (default: {DEFAULT_CACHE_PATH}, entries expire after 1 hour)")
     ap.add_argument("--diagnose-fields", action="store_true", help="Create a diagnostic file to help find custom field IDs.")
     args = ap.parse_args()
+    if args.limit < 1:
+        ap.error("--limit must be a positive integer")
+    if args.workers < 1:
+        ap.error("--workers must be a positive integer")
+    if args.pages_per_request < 1:
+        ap.error("--pages-per-request must be a positive integer")
+    if args.limit > XRAY_MAX_LIMIT:
+        print(f"Warning: --limit {args.limit} exceeds the Xray maximum; using {XRAY_MAX_LIMIT}", file=sys.stderr)
 
     # .env에서 설정 값들을 가져오고, 앞뒤 공백과 따옴표를 제거하여 안정성을 높임
     client_id = (os.getenv("XRAY_CLIENT_ID") or "").strip().strip("'\"")
@@ -261,50 +561,37 @@ def main():
 
     print(f"Using Client ID: {client_id[:4]}...{client_id[-4:]}")
     print(f"Using JQL: {jql}")
+    session = create_session(http2=args.http2)
+
     print("[1/3] Authenticating...")
-    token = get_token(client_id, client_secret)
+    token = get_token(session, client_id, client_secret)
     print(" -> OK")
 
     if args.diagnose_fields:
-        run_field_diagnostics(token, jql)
+        run_field_diagnostics(session, token, jql)
         sys.exit(0)
 
     print("[2/3] Fetching tests...")
-    tests = fetch_all_tests(token, jql, limit=args.limit)
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = open_cache(args.cache_path)
+        except sqlite3.Error as e:
+            _warn_cache_error(e)
+    tests = fetch_all_tests(session, token, jql, limit=args.limit, workers=args.workers,
+                            pages_per_request=args.pages_per_request, cache=cache, client_id=client_id)
     print(f" -> {len(tests)} test issues fetched")
 
     print("[3/3] Writing Excel...")
     rows = flatten_rows(tests)
-    df = pd.DataFrame(
-        rows,
-        columns=[
-            "Test Key", "Summary", "Labels",
-            *CUSTOM_FIELDS_TO_EXPORT.values(),  # 설정된 사용자 정의 필드 컬럼들을 동적으로 추가
-            "Step #",
-            "Step Precondition", "Action", "Expected Result",
-            "Issue Preconditions (keys & titles)", "Issue Preconditions Definition",
-        ],
-    )
-
-    with pd.ExcelWriter(args.outfile, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="Xray Tests", index=False)
-        ws = writer.sheets["Xray Tests"]
-        # 간단 열폭 조정
-        for col_cells in ws.columns:
-            max_len = 10
-            letter = col_cells[0].column_letter
-            for c in col_cells:
-                v = "" if c.value is None else str(c.value)
-                if len(v) > max_len:
-                    max_len = len(v)
-            ws.column_dimensions[letter].width = min(max_len + 2, 80)
+    write_excel(rows, EXPORT_COLUMNS, args.outfile, sheet_name="Xray Tests")
 
     print(f"Done. Saved: {args.outfile}")
 
 if __name__ == "__main__":
     try:
         main()
-    except requests.HTTPError as e:
+    except HTTP_ERRORS as e:
         if e.response.status_code == 401:
             print("\n오류: 인증에 실패했습니다 (401 Unauthorized).", file=sys.stderr)
             print(".env 파일의 XRAY_CLIENT_ID와 XRAY_CLIENT_SECRET 값이 올바른지 다시 확인해 주세요.", file=sys.stderr)